@@ -9,41 +9,103 @@ from plotly import graph_objects as go
 import plotly.express as px
 import sys
 import getopt
+import csv
 import re
 import os
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import sqlalchemy # Pode manter, embora não seja estritamente usado como 'sqlalchemy.something'
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.exc import OperationalError
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pacsv
+except ImportError: # pyarrow é opcional; sem ele usamos o engine C do pandas
+    pa = None
+    pc = None
+    pacsv = None
 # from sqlalchemy.inspect import inspect # <<< Comentamos esta linha, não é mais necessária!
 
 
+# Copy-on-write: fatias de DataFrames só copiam as colunas que forem modificadas
+# (já é o comportamento padrão a partir do pandas 3.0, onde a opção está obsoleta)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Renomear as colunas - apenas os nomes de origem que diferem do padrão (ajuste se seus headers forem diferentes)
+COLUMN_MAPPING = {
+    'PERTE': 'PERTENENCIA_ESTABLECIMIENTO_SALUD',
+    'SEXO_PERSONA': 'SEXO',
+    'EDAD_GRUPO': 'GRUPO_EDAD',
+    'GRUPOS_ETAREOS': 'ETNIA',
+    'DIAS_ESTADIA': 'DIAS_ESTADA', # Corrigido de ESTADIA
+}
+
+# Colunas padronizadas da tabela egresos_pacientes
+COLUMNS = [
+    'PERTENENCIA_ESTABLECIMIENTO_SALUD', 'SEXO', 'GRUPO_EDAD', 'ETNIA', 'GLOSA_PAIS_ORIGEN',
+    'COMUNA_RESIDENCIA', 'GLOSA_COMUNA_RESIDENCIA', 'REGION_RESIDENCIA', 'GLOSA_REGION_RESIDENCIA',
+    'PREVISION', 'GLOSA_PREVISION', 'ANO_EGRESO', 'DIAG1', 'DIAG2', 'DIAS_ESTADA',
+    'CONDICION_EGRESO', 'INTERV_Q', 'PROCED',
+]
+
+# Colunas lidas dos CSVs: nomes de origem e nomes já padronizados
+USECOLS = set(COLUMNS) | set(COLUMN_MAPPING)
+
+# Colunas convertidas para inteiro (com o menor tipo inteiro que comporta os valores esperados
+# de cada coluna; _to_int usa int64 quando um bloco traz valores fora desse intervalo)
+INT_COLUMNS = {
+    'COMUNA_RESIDENCIA': 'int32',
+    'REGION_RESIDENCIA': 'int8',
+    'ANO_EGRESO': 'int16',
+    'DIAS_ESTADA': 'int32',
+}
+
+# Demais colunas numéricas (lidas como texto em load_data)
+NUMERIC_COLUMNS = ['CONDICION_EGRESO', 'INTERV_Q', 'PROCED']
+
+# Colunas de texto com poucos valores distintos, armazenadas como 'category'
+CATEGORY_COLUMNS = ['SEXO', 'PREVISION', 'ETNIA', 'GLOSA_REGION_RESIDENCIA',
+                    'GLOSA_PREVISION', 'GLOSA_PAIS_ORIGEN']
+
+# Padrões compilados uma única vez: ano no final do caminho e nome dos arquivos de egresos
+_YEAR_RE = re.compile(r'(\d{4})\.csv$')
+_EGRE_RE = re.compile(r'EGRE_DATOS_ABIERTOS_(\d{4})\.csv$')
+
+
 '''
 Analisar argumentos da linha de comando para 
-retornar o caminho do arquivo.
+retornar o caminho do arquivo e o modo detalhado.
 
 Retorna:
 file_path (str): o caminho para o arquivo 
 fornecido pelo usuário.
+verbose (bool): True se '-v' ou '--verbose' foi informado.
 '''
 
 def parse_arguments():
-    unixOptions = 'f:' # argumento no formato unix e ira retornar '-f'
-    gnuOptions = ['file='] # argumento no formato gnu e ira retornar '--file='
+    unixOptions = 'f:v' # argumentos no formato unix e irao retornar '-f' e '-v'
+    gnuOptions = ['file=', 'verbose'] # argumentos no formato gnu e irao retornar '--file=' e '--verbose'
 
     fullCmdArguments = sys.argv
     argumentList = fullCmdArguments[1:] # excluir o nome do script
 
     file_path = ''
+    verbose = False
     try:
         arguments, values = getopt.getopt(argumentList, unixOptions, gnuOptions)
         for currentArgument, currentValue in arguments:
             if currentArgument in ('-f', '--file'):
                 file_path = currentValue
+            elif currentArgument in ('-v', '--verbose'):
+                verbose = True
     except getopt.error as err:
         print(f"Error parsing arguments: {err}")
         sys.exit(2)
                 
-    return file_path
+    return file_path, verbose
 
 
 '''
@@ -52,74 +114,152 @@ Extrair o ano do nome do caminho.
 Retorna:
 o ano do documento com os dados.
 '''
-# Dividir o caminho do arquivo em partes
 
 def extract_year_from_path(file_path):
     # Use re to find a 4-digit number that likely represents the year in the filename
-    match = re.search(r'(\d{4})\.csv$', file_path)
+    match = _YEAR_RE.search(file_path)
     if match:
         return int(match.group(1))
 
-    # Fallback if the pattern doesn't match, or if year is in another part of the path
-    try:
-        # Tries to get the last 4 characters before .csv, if structure is like '...2018.csv'
-        year_str = file_path.split('/')[-1].split('.')[0][-4:]
-        return int(year_str)
-    
-    except (ValueError, IndexError):
-        print(f"[ERROR]: Could not extract year from file path: {file_path}")
-        return None
+    print(f"[ERROR]: Could not extract year from file path: {file_path}")
+    return None
 
 
-'''
-Valida se os dados que queremos armazenar já existem no banco de dados. Para fazer isso:
-1. Use o objeto "engine" para se conectar ao banco de dados.
-2. Crie uma consulta SQL para verificar se há algum registro em "table_name" correspondente ao "year" (ano) fornecido.
-3. Execute a consulta SQL.
-        
-Retorna:
-True se os dados já estão armazenados no seu banco de dados. Caso contrário, retorna False. Analisar
-outros resultados possíveis ao consultar a tabela.
-'''
+def get_existing_years(engine, table_name):
+    """
+    Retorna, em uma única consulta, o conjunto de anos já armazenados na tabela,
+    para que a existência de cada arquivo seja verificada localmente.
 
-def data_already_exist(engine, table_name, year):
-    if year is None: # Handle cases where year extraction failed
-        print("[WARNING]: Year could not be extracted for data existence check. Assuming data might not exist.")
-        return False
-        
+    Args:
+        engine (sqlalchemy.engine.base.Engine): O engine do SQLAlchemy.
+        table_name (str): O nome da tabela a ser consultada.
+
+    Returns:
+        set: Os valores distintos de ANO_EGRESO (vazio se a tabela ainda não existir).
+    """
     try:
         with engine.connect() as connection:
-            # Consultar a nova tabela
-            # Usando LIMIT 1 para otimizar, já que só precisamos saber se existe *algum* registro
-            query = text(f'SELECT 1 FROM {table_name} WHERE ANO_EGRESO = :year_val LIMIT 1')
-            result = connection.execute(query, {'year_val': year})
-            exists = result.fetchone() is not None
-            return exists
+            query = text(f'SELECT DISTINCT ANO_EGRESO FROM {table_name}')
+            return {row[0] for row in connection.execute(query)}
     except OperationalError as e:
-        # Se a tabela não existe ainda, isso causará um OperationalError.
-        # Nesse caso, os dados não "existem" na tabela.
-        # Imprimir uma mensagem mais específica para este caso.
         if "no such table" in str(e).lower():
             print(f"[INFO]: Tabela '{table_name}' não existe ainda. Dados não existem.")
         else:
-            print(f"[ERRO]: Erro operacional ao verificar existência de dados: {e}")
-        return False
-    except Exception as e:
-        print(f"[ERRO]: Ocorreu um erro inesperado ao verificar existência de dados: {e}")
-        return False
-
-# Carregar os dados em um DataFrame para operações futuras
-
-def load_data(file_path):
+            print(f"[ERRO]: Erro operacional ao consultar os anos existentes: {e}")
+        return set()
+
+# Ler o CSV em blocos com o leitor em streaming do PyArrow (open_csv, que processa
+# um bloco de cada vez em uma única thread).
+# O cabeçalho é lido antes (com o módulo csv, respeitando aspas) para selecionar apenas
+# as colunas conhecidas (USECOLS) e forçá-las como texto (equivalente a dtype=str).
+# As colunas de texto continuam em memória Arrow ('string[pyarrow]') em vez de objetos Python.
+
+def _read_csv_pyarrow(file_path, chunksize, block_size=1 << 20):
+    with open(file_path, encoding='latin1', newline='') as f:
+        header = next(csv.reader(f, delimiter=';'), [])
+    columns = [col for col in header if col in USECOLS]
+    if not columns:
+        # include_columns=[] faria o PyArrow ler todas as colunas com tipos inferidos
+        raise ValueError(f"Nenhuma coluna conhecida encontrada no cabeçalho: {header}")
+
+    reader = pacsv.open_csv(
+        file_path,
+        read_options=pacsv.ReadOptions(encoding='latin1', block_size=block_size),
+        parse_options=pacsv.ParseOptions(delimiter=';'),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types={col: pa.string() for col in columns},
+            strings_can_be_null=True,
+        ),
+    )
+
+    types_mapper = {pa.string(): pd.StringDtype('pyarrow')}.get
+
+    # Agrupa os record batches até atingir aproximadamente 'chunksize' linhas
+    def chunks():
+        batches, rows = [], 0
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunksize:
+                yield pa.Table.from_batches(batches).to_pandas(types_mapper=types_mapper)
+                batches, rows = [], 0
+        if batches:
+            yield pa.Table.from_batches(batches).to_pandas(types_mapper=types_mapper)
+
+    return chunks()
+
+
+# Carregar os dados em blocos (chunks) de DataFrames para operações futuras.
+# Apenas as colunas em USECOLS são lidas, todas como texto: os valores '*' precisam
+# chegar intactos ao filtro de preprocess_data, que faz a conversão numérica.
+
+def load_data(file_path, chunksize=500_000):
     try:
-        df = pd.read_csv(file_path, encoding='latin1', sep=';')
-        return df
+        if pacsv is not None:
+            return _read_csv_pyarrow(file_path, chunksize)
+        return pd.read_csv(file_path, encoding='latin1', sep=';', chunksize=chunksize, dtype=str,
+                           usecols=lambda col: col in USECOLS)
     except FileNotFoundError:
         print(f"[ERROR]: Arquivo não encontrado em {file_path}")
-        return pd.DataFrame() # Retorna um DataFrame vazio em caso de erro
+        return [] # Retorna um iterável vazio em caso de erro
     except Exception as e:
         print(f"[ERROR]: Erro ao carregar dados de {file_path}: {e}")
-        return pd.DataFrame()
+        return []
+
+
+# Converter uma coluna de texto para inteiro em uma única passada, com 0 para valores
+# ausentes ou não numéricos. Usa os kernels do PyArrow quando a coluna contém apenas
+# dígitos e '*'; caso contrário, recorre a pd.to_numeric. A conversão é feita em int64
+# e só então reduzida para int_dtype, se os valores couberem; senão a coluna fica em
+# int64 (nunca há estouro silencioso).
+
+def _to_int(series, int_dtype):
+    values = None
+    if pc is not None:
+        arr = pa.array(series, from_pandas=True, type=pa.string())
+        is_digit = pc.utf8_is_digit(arr)
+        if pc.all(pc.or_(is_digit, pc.equal(arr, '*'))).as_py() is not False:
+            try:
+                digits = pc.if_else(is_digit, arr, pa.scalar(None, pa.string()))
+                values = pc.fill_null(pc.cast(digits, pa.int64()), 0).to_numpy()
+            except pa.ArrowInvalid: # ex.: número com mais dígitos do que cabe em int64
+                pass
+
+    if values is None:
+        values = pd.to_numeric(series, errors='coerce').fillna(0).to_numpy()
+    if len(values) == 0:
+        return values.astype(int_dtype)
+
+    low, high = values.min(), values.max()
+    for dtype in (int_dtype, 'int64'):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            if dtype != int_dtype:
+                print(f"[AVISO]: Coluna '{series.name}' tem valores fora do intervalo de {int_dtype} ({low} a {high}). Usando int64.")
+            return values.astype(dtype)
+    raise ValueError(f"Coluna '{series.name}' tem valores fora do intervalo de int64 ({low} a {high}).")
+
+
+# Calcular, para um esquema de entrada (tupla de colunas), quais renomeações e conversões
+# preprocess_data deve aplicar. Os arquivos de um mesmo ano compartilham o esquema, então
+# as verificações de existência de colunas são feitas uma vez por esquema, não por bloco.
+
+@functools.lru_cache(maxsize=None)
+def _preprocessing_plan(columns):
+    rename_mapping = {k: v for k, v in COLUMN_MAPPING.items() if k in columns}
+    renamed = {rename_mapping.get(col, col) for col in columns}
+
+    int_columns = []
+    for col, int_dtype in INT_COLUMNS.items():
+        if col in renamed:
+            int_columns.append((col, int_dtype))
+        else:
+            print(f"[AVISO]: Coluna '{col}' não encontrada para conversão para inteiro. Pulando.")
+
+    numeric_columns = [col for col in NUMERIC_COLUMNS if col in renamed]
+    category_columns = [col for col in CATEGORY_COLUMNS if col in renamed]
+    return rename_mapping, int_columns, numeric_columns, category_columns
 
 
 '''
@@ -155,46 +295,50 @@ def preprocess_data(df, threshold=0.5):
     allowed_stars = int(num_columns * threshold)
 
     # Filtrar as linhas em que o número de caracteres '*' excede o limiar permitido
-    cleaned_df = df[df.apply(lambda x: (x == '*').sum() <= allowed_stars, axis=1)].copy() # Use .copy() para evitar SettingWithCopyWarning
-
-    # Renomear as colunas - Mapeamento explícito (ajuste se seus headers forem diferentes)
-    column_mapping = {
-        'PERTE': 'PERTENENCIA_ESTABLECIMIENTO_SALUD',
-        'SEXO_PERSONA': 'SEXO',
-        'EDAD_GRUPO': 'GRUPO_EDAD',
-        'GRUPOS_ETAREOS': 'ETNIA',
-        'GLOSA_PAIS_ORIGEN': 'GLOSA_PAIS_ORIGEN',
-        'COMUNA_RESIDENCIA': 'COMUNA_RESIDENCIA',
-        'GLOSA_COMUNA_RESIDENCIA': 'GLOSA_COMUNA_RESIDENCIA',
-        'REGION_RESIDENCIA': 'REGION_RESIDENCIA',
-        'GLOSA_REGION_RESIDENCIA': 'GLOSA_REGION_RESIDENCIA',
-        'PREVISION': 'PREVISION',
-        'GLOSA_PREVISION': 'GLOSA_PREVISION',
-        'ANO_EGRESO': 'ANO_EGRESO',
-        'DIAG1': 'DIAG1',
-        'DIAG2': 'DIAG2',
-        'DIAS_ESTADIA': 'DIAS_ESTADA', # Corrigido de ESTADIA
-        'CONDICION_EGRESO': 'CONDICION_EGRESO',
-        'INTERV_Q': 'INTERV_Q',
-        'PROCED': 'PROCED'
-    }
-    
-    # Aplica o renomeio apenas para as colunas que realmente existem no DataFrame
-    valid_column_mapping = {k: v for k, v in column_mapping.items() if k in cleaned_df.columns}
-    cleaned_df.rename(columns=valid_column_mapping, inplace=True)
-
-    # Converter colunas específicas para o tipo inteiro
-    int_columns_to_convert = ['COMUNA_RESIDENCIA', 'REGION_RESIDENCIA', 'ANO_EGRESO', 'DIAS_ESTADA']
-    for col in int_columns_to_convert:
-        if col in cleaned_df.columns:
-            # Converte valores não numéricos para NaN, preenche NaN com 0 e converte para int
-            cleaned_df[col] = pd.to_numeric(cleaned_df[col], errors='coerce').fillna(0).astype(int)
-        else:
-            print(f"[AVISO]: Coluna '{col}' não encontrada para conversão para inteiro. Pulando.")
+    # Mapa de bits coluna a coluna (1 byte por célula) seguido de uma única contagem por linha
+    star_bitmap = np.empty((num_columns, len(df)), dtype=np.bool_)
+    for i, col in enumerate(df.columns):
+        star_bitmap[i] = df[col].eq('*').to_numpy(dtype=bool, na_value=False)
+    star_counts = np.count_nonzero(star_bitmap, axis=0)
+    cleaned_df = df.loc[star_counts <= allowed_stars] # Sem .copy(): com copy-on-write não há SettingWithCopyWarning
+
+    # Plano de conversão calculado uma única vez por conjunto de colunas
+    rename_mapping, int_columns, numeric_columns, category_columns = _preprocessing_plan(tuple(df.columns))
+
+    # Renomear as colunas
+    if rename_mapping:
+        cleaned_df = cleaned_df.rename(columns=rename_mapping)
+
+    # Converter colunas específicas para o tipo inteiro (valores não numéricos e ausentes viram 0)
+    for col, int_dtype in int_columns:
+        cleaned_df[col] = _to_int(cleaned_df[col], int_dtype)
+
+    for col in numeric_columns:
+        cleaned_df[col] = pd.to_numeric(cleaned_df[col], errors='coerce')
+
+    for col in category_columns:
+        cleaned_df[col] = cleaned_df[col].astype('category')
 
     return cleaned_df
 
 
+# Salvar, no processo principal, o resultado do bloco mais antigo da fila de pré-processamento.
+# Os blocos são consumidos na ordem de envio; o future e o DataFrame são liberados ao retornar.
+
+def _save_next_chunk(pending, engine, table_name, saved_rows, verbose=False):
+    future, filename = pending.popleft()
+    try:
+        processed_data = future.result()
+    except Exception as e:
+        print(f"[ERRO]: Falha ao pré-processar um bloco de '{filename}': {e}")
+        return
+
+    if verbose:
+        print(f'[INFO]: Dados pré-processados. Contém {len(processed_data)} linhas. Colunas após processamento: {processed_data.columns.tolist()}')
+    if not processed_data.empty and save_to_database(processed_data, engine, table_name):
+        saved_rows[filename] += len(processed_data)
+
+
 '''
 Criar uma conexão ao banco de dados com "sqlite:///"
 1. Crie uma string de conexão usando um nome de banco de dados conveniente.  Por exemplo,
@@ -228,6 +372,25 @@ def create_db_engine(db_path):
     connection_string = f'sqlite:///{db_path}'
     try:
         engine = create_engine(connection_string)
+
+        # Ajustes de desempenho do SQLite aplicados a cada nova conexão
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-200000") # ~200 MB
+            cursor.close()
+
+        # Atualiza as estatísticas do planejador de consultas ao fechar cada conexão
+        @event.listens_for(engine, "close")
+        def _optimize_on_close(dbapi_connection, connection_record):
+            try:
+                dbapi_connection.execute("PRAGMA optimize")
+            except Exception as e:
+                print(f"[AVISO]: PRAGMA optimize falhou ao fechar a conexão: {e}")
+
         # Testa a conexão executando uma consulta simples
         with engine.connect() as connection:
             connection.execute(text("SELECT 1"))
@@ -247,7 +410,7 @@ Salvar o DataFrame (df) limpo no seu banco de dados.
 4. A conexão ao banco de dados é gerenciada usando o mecanismo fornecido.
 '''
 
-def save_to_database(df, engine, table_name):
+def save_to_database(df, engine, table_name, batch_size=50_000):
     """
     Salva o DataFrame limpo na tabela SQL especificada.
 
@@ -255,20 +418,46 @@ def save_to_database(df, engine, table_name):
         df (pd.DataFrame): O DataFrame a ser salvo.
         engine (sqlalchemy.engine.base.Engine): O engine do SQLAlchemy.
         table_name (str): O nome da tabela onde salvar.
+        batch_size (int): Número de linhas convertidas para objetos Python e inseridas por vez.
+
+    Returns:
+        bool: True se os dados foram salvos; False se o DataFrame estava vazio ou houve erro.
     """
     if df.empty:
         print("[AVISO]: DataFrame vazio fornecido para salvar no banco de dados. Operação de salvamento ignorada.")
-        return
+        return False
 
     try:
-        df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
+        columns = ', '.join(f'"{col}"' for col in df.columns)
+        placeholders = ', '.join('?' * len(df.columns))
+        insert_query = f'INSERT INTO {table_name} ({columns}) VALUES ({placeholders})'
+
+        # Criação da tabela, inserção e índice em uma única conexão e transação
+        # (um único commit por arquivo; rollback automático em caso de erro)
+        with engine.begin() as connection:
+            # Cria a tabela (se necessário) com o esquema inferido pelo pandas, sem inserir linhas
+            df.head(0).to_sql(name=table_name, con=connection, if_exists='append', index=False)
+
+            # Insere as linhas direto pelo driver sqlite3, em fatias de batch_size linhas:
+            # só a fatia atual é convertida para objetos Python (None no lugar de NaN/NA)
+            cursor = connection.connection.cursor()
+            for start in range(0, len(df), batch_size):
+                batch = df.iloc[start:start + batch_size]
+                rows = batch.astype(object).where(batch.notna(), None).itertuples(index=False, name=None)
+                cursor.executemany(insert_query, rows)
+            # Índice por ano para as consultas de existência e validação
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_ano_egreso ON {table_name} (ANO_EGRESO)')
+            cursor.close()
+
         print(f"[INFO]: Dados carregados com sucesso na tabela '{table_name}'.")
+        return True
     except Exception as e:
         print(f"[ERRO]: Falha ao salvar dados na tabela do banco de dados '{table_name}': {e}")
+        return False
 
 
 # --- CÓDIGO SIMPLIFICADO PARA TESTAR O PIPELINE (SEM INSPECT) ---
-def validate_data(engine, table_name):
+def validate_data(engine, table_name, debug=False):
     """
     Valida os dados imprimindo a contagem de registros por ano do banco de dados.
     Esta versão simplificada tenta apenas consultar a tabela diretamente.
@@ -276,14 +465,20 @@ def validate_data(engine, table_name):
     Args:
         engine (sqlalchemy.engine.base.Engine): O engine do SQLAlchemy.
         table_name (str): O nome da tabela a ser validada.
+        debug (bool): Se True, imprime o plano da consulta (EXPLAIN QUERY PLAN).
     """
     print(f"\n--- Validação do Banco de Dados: Registros por ano em '{table_name}' ---")
     try:
-        with engine.connect() as connection:
+        with engine.begin() as connection:
             # Tenta consultar a tabela diretamente. Se a tabela não existir,
             # uma OperationalError será levantada e capturada.
-            query = text(f'SELECT ANO_EGRESO, count(*) FROM {table_name} GROUP BY ANO_EGRESO ORDER BY ANO_EGRESO')
-            result = connection.execute(query)
+            # O índice por ano permite que a contagem seja feita só pelo índice.
+            connection.execute(text(f'CREATE INDEX IF NOT EXISTS idx_ano_egreso ON {table_name} (ANO_EGRESO)'))
+            query = f'SELECT ANO_EGRESO, count(*) FROM {table_name} GROUP BY ANO_EGRESO ORDER BY ANO_EGRESO'
+            if debug:
+                for step in connection.execute(text(f'EXPLAIN QUERY PLAN {query}')):
+                    print(f"[DEBUG]: Plano da consulta: {step[-1]}")
+            result = connection.execute(text(query))
             rows = result.fetchall()
             
             if rows:
@@ -319,6 +514,10 @@ if __name__ == "__main__":
     table_name = 'egresos_pacientes'
     db_path = os.path.join(os.path.dirname(__file__), 'database', 'ministerio_de_salud_chile.db')
 
+    # '-v'/'--verbose' habilita os logs detalhados por bloco e o plano da consulta de validação.
+    # Os argumentos são lidos antes de abrir o banco, para que uma opção inválida não o crie.
+    _, verbose = parse_arguments()
+
     # Cria o engine do DB (e garante que o diretório do banco de dados exista)
     engine = create_db_engine(db_path)
 
@@ -329,40 +528,61 @@ if __name__ == "__main__":
         print(f"[ERRO]: Diretório de dados '{data_directory}' não encontrado. Por favor, crie-o e coloque seus arquivos CSV dentro.")
         sys.exit(1) # Sai se o diretório de dados não existir
 
+    # Consulta os anos já armazenados uma única vez, antes de percorrer os arquivos
+    existing_years = get_existing_years(engine, table_name)
+
     print(f"\nVerificando arquivos em: {data_directory}")
-    for filename in os.listdir(data_directory):
-        # Usa um padrão de regex para corresponder aos seus arquivos (ex: EGRE_DATOS_ABIERTOS_AAAA.csv)
-        if re.match(r'EGRE_DATOS_ABIERTOS_\d{4}\.csv$', filename):
-            file_path = os.path.join(data_directory, filename)
-            
-            print(f"\n--- Processando arquivo: {filename} ---")
-            
-            year = extract_year_from_path(file_path)
-            if year is None:
-                print(f"[PULAR]: Não foi possível extrair o ano de {filename}. Pulando este arquivo.")
-                continue
-
-            # Verifica se os dados para este ano já existem no banco de dados
-            if data_already_exist(engine, table_name, year):
-                print(f"Dados para o ano {year} de '{filename}' já existem no banco de dados. Pulando.")
-            else:
-                print(f"[INFO]: Dados para o ano {year} de '{filename}' não encontrados. Carregando e processando.")
-                raw_data = load_data(file_path)
-                
-                if not raw_data.empty:
-                    print(f'[INFO]: {len(raw_data)} linhas carregadas. Colunas originais: {raw_data.columns.tolist()}')
-                    processed_data = preprocess_data(raw_data)
-                    print(f'[INFO]: Dados pré-processados. Contém {len(processed_data)} linhas. Colunas após processamento: {processed_data.columns.tolist()}')
-                    
-                    if not processed_data.empty:
-                        save_to_database(processed_data, engine, table_name)
-                        processed_any_file = True
-                    else:
-                        print(f"[AVISO]: Dados processados para '{filename}' estão vazios. Não salvando no DB.")
-                else:
-                    print(f"[AVISO]: Falha ao carregar dados de '{filename}'. Pulando pré-processamento e salvamento.")
+    # Usa um padrão de regex para corresponder aos seus arquivos (ex: EGRE_DATOS_ABIERTOS_AAAA.csv);
+    # os.scandir já informa se a entrada é um arquivo, e a ordenação deixa a execução determinística
+    with os.scandir(data_directory) as entries:
+        egre_files = sorted(
+            (entry.name, entry.path) for entry in entries
+            if entry.is_file() and _EGRE_RE.match(entry.name)
+        )
+
+    files_to_process = []
+    for filename, file_path in egre_files:
+        print(f"\n--- Processando arquivo: {filename} ---")
+
+        # Extrai o ano do próprio nome do arquivo
+        year = int(_EGRE_RE.match(filename).group(1))
+
+        # Verifica se os dados para este ano já existem no banco de dados
+        if year in existing_years:
+            print(f"Dados para o ano {year} de '{filename}' já existem no banco de dados. Pulando.")
         else:
-            print(f"[INFO]: Pulando arquivo não correspondente: {filename}")
+            print(f"[INFO]: Dados para o ano {year} de '{filename}' não encontrados. Carregando e processando.")
+            files_to_process.append((file_path, filename))
+
+    # Os blocos de cada arquivo são lidos no processo principal e pré-processados em paralelo;
+    # o salvamento fica no processo principal, pois o SQLite aceita um único escritor.
+    # No máximo max_workers blocos ficam em andamento (o próximo só é enviado depois que o
+    # mais antigo for salvo), e os resultados são salvos na ordem de envio, para que a
+    # ordem das linhas na tabela e dos logs seja a mesma a cada execução.
+    if files_to_process:
+        max_workers = os.cpu_count() or 1
+        loaded_rows = {filename: 0 for _, filename in files_to_process}
+        saved_rows = dict.fromkeys(loaded_rows, 0)
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for file_path, filename in files_to_process:
+                for raw_data in load_data(file_path):
+                    loaded_rows[filename] += len(raw_data)
+                    if verbose:
+                        print(f'[INFO]: {len(raw_data)} linhas carregadas. Colunas originais: {raw_data.columns.tolist()}')
+                    if len(pending) >= max_workers:
+                        _save_next_chunk(pending, engine, table_name, saved_rows, verbose)
+                    pending.append((pool.submit(preprocess_data, raw_data), filename))
+            while pending:
+                _save_next_chunk(pending, engine, table_name, saved_rows, verbose)
+
+        for _, filename in files_to_process:
+            if loaded_rows[filename] == 0:
+                print(f"[AVISO]: Falha ao carregar dados de '{filename}'. Pulando pré-processamento e salvamento.")
+            elif saved_rows[filename] == 0:
+                print(f"[AVISO]: Dados processados para '{filename}' estão vazios. Não salvando no DB.")
+            else:
+                processed_any_file = True
 
     if not processed_any_file:
         print("\nNenhum arquivo novo foi processado ou salvo no banco de dados.")
@@ -370,4 +590,7 @@ if __name__ == "__main__":
         print("\nProcessamento de todos os arquivos novos/não processados concluído.")
     
     # Validação final dos dados no banco de dados
-    validate_data(engine, table_name)
\ No newline at end of file
+    validate_data(engine, table_name, debug=verbose)
+
+    # Fecha as conexões do pool (executando PRAGMA optimize em cada uma)
+    engine.dispose()